@@ -1,13 +1,65 @@
 import json
 import os
 import math
-from collections import defaultdict
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import accumulate
+from operator import attrgetter
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib json module
+    orjson = None
+
+# FEN piece letters, white then black
+PIECE_TYPES = 'PNBRQKpnbrqk'
+
+# Move types and notation characters that mark a tactical move
+TACTICAL_TYPES = ('capture', 'check', 'mate')
+TACTICAL_CHARS = frozenset('x+#')
+
+# Share of moves in each difficulty level, in percent (sums to 100), and the
+# running totals used as split points
+LEVEL_PERCENTAGES = (5, 10, 15, 20, 20, 15, 10, 5)
+LEVEL_CUMULATIVE_PERCENTAGES = tuple(accumulate(LEVEL_PERCENTAGES))
+
+@dataclass(slots=True)
+class MoveEntry:
+    """A move from the knowledge tree with its difficulty score and analysis metadata"""
+    move: str
+    path: tuple
+    difficulty: float
+    rating: int
+    times_played: int
+    win_rate: float
+    depth: int
+    game_phase: str
+    phase_progress: float
+    position_complexity: float
+    move_sequence: tuple
+
+def read_json_file(file_path):
+    """Read a JSON file, using orjson when it is installed"""
+    if orjson is not None:
+        with open(file_path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
+def write_json_file(data, file_path):
+    """Write data as indented JSON, using orjson when it is installed"""
+    if orjson is not None:
+        with open(file_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        return
+    with open(file_path, 'w') as f:
+        json.dump(data, f, indent=2)
 
 def load_chess_knowledge(file_path):
     """Load the chess knowledge JSON file exported by OptimizedChessARN"""
     try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
+        data = read_json_file(file_path)
         print(f"Successfully loaded knowledge file with {count_moves(data['moveTree']['root'])} total moves")
         return data
     except Exception as e:
@@ -23,93 +75,87 @@ def count_moves(node):
 
 def parse_fen_from_position(position):
     """Extract piece positions from a FEN string or position representation"""
+    # Only strings go through the cache; other position data is returned unchanged
+    if isinstance(position, str):
+        return _parse_fen_placement(position)
+    return position
+
+@lru_cache(maxsize=1 << 16)
+def _parse_fen_placement(position):
+    """Cached piece placement part of a FEN string"""
     # If position is a full FEN, extract just the piece placement part
-    if isinstance(position, str) and ' ' in position:
+    if ' ' in position:
         position = position.split(' ')[0]
     return position
 
 def count_pieces(fen):
-    """Count pieces in a FEN position"""
+    """Count pieces in a FEN position, returned as a tuple in PIECE_TYPES order"""
     if not fen or not isinstance(fen, str):
-        return {'P': 0, 'N': 0, 'B': 0, 'R': 0, 'Q': 0, 'K': 0, 
-                'p': 0, 'n': 0, 'b': 0, 'r': 0, 'q': 0, 'k': 0}
-    
-    piece_counts = {'P': 0, 'N': 0, 'B': 0, 'R': 0, 'Q': 0, 'K': 0, 
-                   'p': 0, 'n': 0, 'b': 0, 'r': 0, 'q': 0, 'k': 0}
+        return (0,) * len(PIECE_TYPES)
+    return _count_fen_pieces(fen)
+
+@lru_cache(maxsize=1 << 16)
+def _count_fen_pieces(fen):
+    """Cached piece counts for a FEN piece placement string"""
+    # str.count runs in C, so this is 12 C-level scans instead of a Python loop per character
+    return tuple(fen.count(piece) for piece in PIECE_TYPES)
+
+@lru_cache(maxsize=1 << 16)
+def evaluate_material_and_phase(piece_counts):
+    """Evaluate material, game phase and position complexity from piece counts in one pass
     
-    for char in fen:
-        if char in piece_counts:
-            piece_counts[char] += 1
+    Returns (phase_name, phase_progress, complexity, white_material, black_material).
+    """
+    P, N, B, R, Q, K, p, n, b, r, q, k = piece_counts
     
-    return piece_counts
-
-def determine_game_phase(piece_counts):
-    """Determine game phase based on piece counts"""
     # Calculate material value (excluding kings)
-    white_material = (piece_counts['P'] * 1 + 
-                     piece_counts['N'] * 3 + 
-                     piece_counts['B'] * 3 + 
-                     piece_counts['R'] * 5 + 
-                     piece_counts['Q'] * 9)
-    
-    black_material = (piece_counts['p'] * 1 + 
-                     piece_counts['n'] * 3 + 
-                     piece_counts['b'] * 3 + 
-                     piece_counts['r'] * 5 + 
-                     piece_counts['q'] * 9)
+    white_material = P + 3 * N + 3 * B + 5 * R + 9 * Q
+    black_material = p + 3 * n + 3 * b + 5 * r + 9 * q
     
     total_material = white_material + black_material
     
     # Count total pieces (excluding pawns)
-    total_pieces = (piece_counts['N'] + piece_counts['B'] + piece_counts['R'] + piece_counts['Q'] +
-                   piece_counts['n'] + piece_counts['b'] + piece_counts['r'] + piece_counts['q'])
+    minor_pieces = N + B + n + b
+    major_pieces = R + Q + r + q
+    total_pieces = minor_pieces + major_pieces
     
     # Determine phase
-    if total_pieces >= 12 and piece_counts['Q'] >= 1 and piece_counts['q'] >= 1:
-        return "opening", 0.0  # Early game
+    if total_pieces >= 12 and Q >= 1 and q >= 1:
+        phase_name, phase_progress = "opening", 0.0  # Early game
     elif total_material >= 30:
-        return "opening", min(1.0, (40 - total_material) / 10)  # Late opening
+        phase_name, phase_progress = "opening", min(1.0, (40 - total_material) / 10)  # Late opening
     elif total_material >= 20:
-        return "middlegame", (30 - total_material) / 10  # Middlegame
+        phase_name, phase_progress = "middlegame", (30 - total_material) / 10  # Middlegame
     elif total_material >= 10:
-        return "endgame", (20 - total_material) / 10  # Early endgame
+        phase_name, phase_progress = "endgame", (20 - total_material) / 10  # Early endgame
     else:
-        return "endgame", 1.0  # Late endgame
-
-def calculate_position_complexity(piece_counts, fen=None):
-    """Calculate position complexity based on piece configuration"""
-    # Base complexity on number of pieces and their interactions
-    minor_pieces = (piece_counts['N'] + piece_counts['B'] + 
-                   piece_counts['n'] + piece_counts['b'])
-    
-    major_pieces = (piece_counts['R'] + piece_counts['Q'] + 
-                   piece_counts['r'] + piece_counts['q'])
-    
-    pawns = piece_counts['P'] + piece_counts['p']
+        phase_name, phase_progress = "endgame", 1.0  # Late endgame
     
     # More pieces generally means more complex positions
+    pawns = P + p
     piece_complexity = (minor_pieces * 0.7 + major_pieces * 1.2 + pawns * 0.4) / 20
     
     # Imbalanced material often creates more complex positions
-    white_material = (piece_counts['P'] * 1 + piece_counts['N'] * 3 + 
-                     piece_counts['B'] * 3 + piece_counts['R'] * 5 + 
-                     piece_counts['Q'] * 9)
-    
-    black_material = (piece_counts['p'] * 1 + piece_counts['n'] * 3 + 
-                     piece_counts['b'] * 3 + piece_counts['r'] * 5 + 
-                     piece_counts['q'] * 9)
-    
     material_imbalance = abs(white_material - black_material) / 32  # Normalize
     
     # Positions with queens are generally more complex
-    queen_factor = 0.2 if (piece_counts['Q'] > 0 or piece_counts['q'] > 0) else 0
+    queen_factor = 0.2 if (Q > 0 or q > 0) else 0
     
     # Combine factors
-    complexity = (piece_complexity * 0.6 + 
-                 (1 - material_imbalance) * 0.2 +  # Less imbalance can mean more complex
-                 queen_factor)
+    complexity = min(1.0, piece_complexity * 0.6 + 
+                     (1 - material_imbalance) * 0.2 +  # Less imbalance can mean more complex
+                     queen_factor)
     
-    return min(1.0, complexity)
+    return phase_name, phase_progress, complexity, white_material, black_material
+
+def determine_game_phase(fen):
+    """Determine game phase based on the piece counts of a FEN piece placement"""
+    phase_name, phase_progress, _, _, _ = evaluate_material_and_phase(count_pieces(fen))
+    return phase_name, phase_progress
+
+def calculate_position_complexity(fen):
+    """Calculate position complexity based on the piece configuration of a FEN piece placement"""
+    return evaluate_material_and_phase(count_pieces(fen))[2]
 
 def extract_position_from_path(node, path):
     """Try to extract position information by following a path through the tree"""
@@ -128,14 +174,33 @@ def extract_position_from_path(node, path):
     
     return position_info
 
-def analyze_move_difficulty(node, current_depth=0, path=None, position=None, move_sequence=None):
-    """Analyze moves and assign difficulty ratings based on various factors including position"""
-    if path is None:
-        path = []
-    if move_sequence is None:
-        move_sequence = []
+def analyze_position(position_info):
+    """Determine game phase and position complexity for a node's position information"""
+    if not position_info:
+        return ("unknown", 0.5), 0.5
+    
+    # The analysis helpers are cached per piece placement string
+    if isinstance(position_info, str):
+        fen = parse_fen_from_position(position_info)
+        if not fen:
+            return ("unknown", 0.5), 0.5
+    else:
+        # Position data that isn't a FEN string has no countable pieces
+        fen = None
     
-    moves_with_difficulty = []
+    phase_name, phase_progress, complexity, _, _ = evaluate_material_and_phase(count_pieces(fen))
+    return (phase_name, phase_progress), complexity
+
+def iter_move_difficulty(node, current_depth=0, path=None, position=None, move_sequence=None):
+    """Yield moves with difficulty ratings one at a time in depth-first order
+    
+    analyze_move_difficulty collects this into a list; single-pass callers
+    can iterate it directly.
+    """
+    # path and move_sequence are mutated in place as the traversal descends and
+    # ascends; each result only stores a tuple snapshot of them
+    path = list(path) if path else []
+    move_sequence = list(move_sequence) if move_sequence else []
     
     # Try to determine position from node data
     position_info = position
@@ -145,72 +210,82 @@ def analyze_move_difficulty(node, current_depth=0, path=None, position=None, mov
         elif 'stats' in node and 'position' in node['stats']:
             position_info = node['stats']['position']
     
-    # Parse FEN if available
-    fen = parse_fen_from_position(position_info) if position_info else None
-    piece_counts = count_pieces(fen) if fen else None
-    
-    # Determine game phase and position complexity if we have piece information
-    game_phase = ("unknown", 0.5)
-    position_complexity = 0.5
-    if piece_counts:
-        game_phase = determine_game_phase(piece_counts)
-        position_complexity = calculate_position_complexity(piece_counts, fen)
+    # Explicit DFS stack of (child iterator, depth, position, game phase, position complexity)
+    stack = [(iter(node.get('moves', {}).items()), current_depth, position_info) + analyze_position(position_info)]
     
-    for move_notation, move_data in node.get('moves', {}).items():
-        stats = move_data.get('stats', {})
-        
-        # Try to get position after this move
-        next_position = None
-        if 'position' in move_data:
-            next_position = move_data['position']
-        elif 'stats' in move_data and 'position' in move_data['stats']:
-            next_position = move_data['stats']['position']
-        
-        # Calculate difficulty based on multiple factors
-        difficulty_score = calculate_difficulty_score(
-            rating=stats.get('rating', 1200),
-            times_played=stats.get('timesPlayed', 0),
-            win_rate=calculate_win_rate(stats),
-            depth=current_depth,
-            has_children=bool(move_data.get('moves', {})),
-            game_phase=game_phase,
-            position_complexity=position_complexity,
-            move_sequence=move_sequence + [move_notation],
-            is_capture='capture' in stats.get('type', '').lower() if 'type' in stats else False,
-            is_check='check' in stats.get('type', '').lower() if 'type' in stats else False
-        )
+    while stack:
+        children, depth, position_info, game_phase, position_complexity = stack[-1]
         
-        # Store move with its difficulty score and metadata
-        moves_with_difficulty.append({
-            'move': move_notation,
-            'path': path.copy(),
-            'difficulty': difficulty_score,
-            'rating': stats.get('rating', 1200),
-            'times_played': stats.get('timesPlayed', 0),
-            'win_rate': calculate_win_rate(stats),
-            'depth': current_depth,
-            'game_phase': game_phase[0],
-            'phase_progress': game_phase[1],
-            'position_complexity': position_complexity,
-            'move_data': move_data,
-            'move_sequence': move_sequence + [move_notation]
-        })
-        
-        # Recursively analyze child moves
-        child_path = path.copy()
-        child_path.append(move_notation)
-        child_sequence = move_sequence + [move_notation]
-        moves_with_difficulty.extend(
-            analyze_move_difficulty(
-                move_data, 
-                current_depth + 1, 
-                child_path, 
-                next_position,
-                child_sequence
+        for move_notation, move_data in children:
+            stats = move_data.get('stats', {})
+            
+            # Try to get position after this move
+            next_position = None
+            if 'position' in move_data:
+                next_position = move_data['position']
+            elif 'position' in stats:
+                next_position = stats['position']
+            
+            move_sequence.append(move_notation)
+            
+            # Look up each stat once and share it between the score and the result
+            rating = stats.get('rating', 1200)
+            times_played = stats.get('timesPlayed', 0)
+            win_rate = calculate_win_rate(stats)
+            stats_type = stats.get('type')
+            move_type = stats_type.lower() if stats_type else ''
+            
+            # Calculate difficulty based on multiple factors
+            difficulty_score = difficulty_score_kernel(
+                rating,
+                times_played,
+                win_rate,
+                depth,
+                bool(move_data.get('moves', {})),
+                game_phase[0],
+                game_phase[1],
+                position_complexity,
+                move_notation,
+                'capture' in move_type,
+                'check' in move_type
             )
-        )
-    
-    return moves_with_difficulty
+            
+            # Emit move with its difficulty score and metadata
+            yield MoveEntry(
+                move=move_notation,
+                path=tuple(path),
+                difficulty=difficulty_score,
+                rating=rating,
+                times_played=times_played,
+                win_rate=win_rate,
+                depth=depth,
+                game_phase=game_phase[0],
+                phase_progress=game_phase[1],
+                position_complexity=position_complexity,
+                move_sequence=tuple(move_sequence)
+            )
+            
+            # Reuse this node's analysis when the child's position is unchanged
+            # (including both being unknown)
+            if next_position == position_info:
+                child_analysis = (game_phase, position_complexity)
+            else:
+                child_analysis = analyze_position(next_position)
+            
+            # Descend into the child moves; this frame resumes once they are exhausted
+            path.append(move_notation)
+            stack.append((iter(move_data.get('moves', {}).items()), depth + 1, next_position) + child_analysis)
+            break
+        else:
+            # All children visited, ascend back to the parent
+            stack.pop()
+            if stack:
+                path.pop()
+                move_sequence.pop()
+
+def analyze_move_difficulty(node, current_depth=0, path=None, position=None, move_sequence=None):
+    """Analyze moves and assign difficulty ratings based on various factors including position"""
+    return list(iter_move_difficulty(node, current_depth, path, position, move_sequence))
 
 def calculate_win_rate(stats):
     """Calculate win rate from move statistics"""
@@ -227,39 +302,42 @@ def calculate_win_rate(stats):
 def is_tactical_move(move_notation, move_data):
     """Determine if a move is tactical (capture, check, etc.)"""
     # Check if we have explicit information
-    stats = move_data.get('stats', {})
-    if 'type' in stats:
-        move_type = stats['type'].lower()
-        return 'capture' in move_type or 'check' in move_type or 'mate' in move_type
-    
-    # Try to infer from notation
-    if 'x' in move_notation or '+' in move_notation or '#' in move_notation:
-        return True
+    move_type = move_data.get('stats', {}).get('type')
+    if move_type is not None:
+        move_type = move_type.lower()
+        return any(tactical_type in move_type for tactical_type in TACTICAL_TYPES)
     
-    return False
-
-def is_opening_theory(move_sequence, depth):
-    """Determine if a move is likely part of opening theory"""
-    # Simple heuristic: early moves are more likely to be opening theory
-    if depth <= 10:
-        return True, max(0, 1.0 - (depth / 10))
-    return False, 0.0
+    # Try to infer from notation (one C-level set check instead of three substring scans)
+    return not TACTICAL_CHARS.isdisjoint(move_notation)
 
 def calculate_difficulty_score(rating, times_played, win_rate, depth, has_children, 
                               game_phase, position_complexity, move_sequence, 
                               is_capture=False, is_check=False):
     """Calculate a difficulty score based on multiple factors including position and game phase"""
+    phase_name, phase_progress = game_phase
+    return difficulty_score_kernel(rating, times_played, win_rate, depth, has_children,
+                                   phase_name, phase_progress, position_complexity,
+                                   move_sequence[-1] if move_sequence else '',
+                                   is_capture, is_check)
+
+def difficulty_score_kernel(rating, times_played, win_rate, depth, has_children,
+                            phase_name, phase_progress, position_complexity, last_move,
+                            is_capture, is_check):
+    """Scalar core of calculate_difficulty_score, called positionally from the traversal
+    
+    Takes the game phase unpacked and only the last move of the sequence, so the
+    hot loop passes plain values and never builds a move list.
+    """
     # Base difficulty from rating
     difficulty = (rating - 800) / 2000  # Normalize ratings from ~800-2800
     
     # Phase-specific adjustments
-    phase_name, phase_progress = game_phase
     if phase_name == "opening":
-        # Opening theory knowledge is more important than calculation
-        is_theory, theory_strength = is_opening_theory(move_sequence, depth)
-        if is_theory:
+        # Opening theory knowledge is more important than calculation.
+        # Simple heuristic: early moves are more likely to be opening theory
+        if depth <= 10:
             # Opening theory moves get adjusted based on their popularity and depth
-            theory_factor = 0.7 + 0.3 * theory_strength
+            theory_factor = 0.7 + 0.3 * max(0, 1.0 - (depth / 10))
             difficulty = difficulty * theory_factor
             
             # Popular opening moves are easier for beginners
@@ -278,7 +356,7 @@ def calculate_difficulty_score(rating, times_played, win_rate, depth, has_childr
         # Endgames require specific knowledge
         if phase_progress > 0.7:  # Late endgame
             # Basic endgames are easier, but technical endgames are hard
-            piece_count = sum(1 for c in move_sequence[-1] if c.isalpha())
+            piece_count = sum(1 for c in last_move if c.isalpha())
             if piece_count <= 3:  # Few pieces left
                 difficulty *= 0.9 + position_complexity * 0.5
             else:
@@ -314,58 +392,103 @@ def calculate_difficulty_score(rating, times_played, win_rate, depth, has_childr
 
 def categorize_moves_by_difficulty(moves_with_difficulty, num_levels=8):
     """Split moves into difficulty levels with more sophisticated distribution"""
-    # Sort moves by difficulty
-    sorted_moves = sorted(moves_with_difficulty, key=lambda x: x['difficulty'])
+    if num_levels != len(LEVEL_PERCENTAGES):
+        raise ValueError(f"num_levels must be {len(LEVEL_PERCENTAGES)} to match the level distribution, "
+                         f"got {num_levels}")
+    
+    # Sort moves by difficulty (attrgetter keeps the key extraction in C)
+    sorted_moves = sorted(moves_with_difficulty, key=attrgetter('difficulty'))
     total_moves = len(sorted_moves)
     
     if total_moves == 0:
         return [[] for _ in range(num_levels)]
     
     # Create difficulty levels with non-linear distribution
-    # This gives more moves to intermediate levels and fewer to extreme levels
-    difficulty_levels = [[] for _ in range(num_levels)]
+    # This gives more moves to intermediate levels and fewer to extreme levels.
+    # The last split point is always total_moves, so no moves are left over
+    split_points = [cumulative * total_moves // 100 for cumulative in LEVEL_CUMULATIVE_PERCENTAGES]
     
-    # Define distribution percentages for each level (should sum to 100)
-    level_percentages = [5, 10, 15, 20, 20, 15, 10, 5]
-    
-    start_idx = 0
-    for level, percentage in enumerate(level_percentages):
-        moves_in_level = int((percentage / 100) * total_moves)
-        end_idx = start_idx + moves_in_level
-        
-        # Ensure we don't exceed array bounds
-        end_idx = min(end_idx, total_moves)
-        
-        difficulty_levels[level] = sorted_moves[start_idx:end_idx]
-        start_idx = end_idx
-    
-    # Assign any remaining moves to the last level
-    if start_idx < total_moves:
-        difficulty_levels[-1].extend(sorted_moves[start_idx:])
-    
-    return difficulty_levels
+    return [sorted_moves[start_idx:end_idx]
+            for start_idx, end_idx in zip([0] + split_points, split_points)]
 
-def create_level_knowledge_tree(level_moves):
-    """Create a knowledge tree containing only moves from a specific level"""
+def find_node_by_path(node_by_path, path, create=False):
+    """Return the tree node reached by following path, remembering every node walked
+    
+    node_by_path maps path tuples to nodes and must contain the root under ().
+    With create, missing nodes along the way are added as empty placeholders.
+    """
+    node = node_by_path.get(path)
+    if node is None:
+        # Walk down from the deepest known prefix
+        known = len(path) - 1
+        while path[:known] not in node_by_path:
+            known -= 1
+        node = node_by_path[path[:known]]
+        for i in range(known, len(path)):
+            path_move = path[i]
+            if create and path_move not in node['moves']:
+                node['moves'][path_move] = {'moves': {}, 'stats': {'timesVisited': 0}}
+            node = node['moves'][path_move]
+            node_by_path[path[:i + 1]] = node
+    return node
+
+def create_level_knowledge_tree(level_moves, source_nodes):
+    """Create a knowledge tree containing only moves from a specific level
+    
+    MoveEntry only holds scalar fields, so each move's original subtree is
+    looked up by path in source_nodes (see find_node_by_path), which can be
+    shared between levels.
+    """
     root = {'moves': {}, 'stats': {'timesVisited': 0, 'firstSeen': 0}}
     
+    # Tree node for every path prefix walked so far, so shared prefixes are
+    # only navigated once
+    node_by_path = {(): root}
+    
     for move_info in level_moves:
-        path = move_info['path']
-        move = move_info['move']
-        move_data = move_info['move_data']
+        path = move_info.path
+        move = move_info.move
+        move_data = find_node_by_path(source_nodes, path + (move,))
         
         # Navigate to the correct position in the tree
-        current_node = root
-        for path_move in path:
-            if path_move not in current_node['moves']:
-                current_node['moves'][path_move] = {'moves': {}, 'stats': {'timesVisited': 0}}
-            current_node = current_node['moves'][path_move]
+        current_node = find_node_by_path(node_by_path, path, create=True)
         
-        # Add the move to this position
+        # Add the move to this position. Deeper moves continue inside move_data;
+        # any placeholder it replaces only held nodes move_data already contains
         current_node['moves'][move] = move_data
+        node_by_path[path + (move,)] = move_data
     
     return root
 
+def calculate_level_stats(level_moves):
+    """Aggregate phase distribution, complexity, rating and difficulty range for a level
+    
+    Expects a non-empty level as produced by categorize_moves_by_difficulty, which
+    is already sorted by difficulty, so the range comes from the first and last move.
+    """
+    phase_counts = {
+        "opening": 0,
+        "middlegame": 0,
+        "endgame": 0,
+        "unknown": 0
+    }
+    complexity_sum = 0
+    rating_sum = 0
+    
+    for move in level_moves:
+        phase_counts[move.game_phase] += 1
+        complexity_sum += move.position_complexity
+        rating_sum += move.rating
+    
+    total_moves = len(level_moves)
+    return {
+        'phase_distribution': {phase: count / total_moves for phase, count in phase_counts.items()},
+        'average_complexity': complexity_sum / total_moves,
+        'average_rating': rating_sum / total_moves,
+        'min_difficulty': level_moves[0].difficulty,
+        'max_difficulty': level_moves[-1].difficulty
+    }
+
 def save_difficulty_levels(difficulty_levels, original_data, output_dir):
     """Save each difficulty level as a separate JSON file with enhanced metadata"""
     level_names = [
@@ -393,34 +516,21 @@ def save_difficulty_levels(difficulty_levels, original_data, output_dir):
     
     os.makedirs(output_dir, exist_ok=True)
     
+    # Original subtrees by path, shared by all levels' tree rebuilds
+    source_nodes = {(): original_data['moveTree']['root']}
+    
     for i, (level_name, level_moves) in enumerate(zip(level_names, difficulty_levels)):
         if not level_moves:
             print(f"Warning: No moves for {level_name} level. Skipping.")
             continue
             
         # Create a new knowledge tree with only moves from this level
-        level_tree = create_level_knowledge_tree(level_moves)
-        
-        # Calculate phase distribution
-        phase_counts = {
-            "opening": 0,
-            "middlegame": 0,
-            "endgame": 0,
-            "unknown": 0
-        }
-        
-        for move in level_moves:
-            phase = move.get('game_phase', 'unknown')
-            phase_counts[phase] += 1
+        level_tree = create_level_knowledge_tree(level_moves, source_nodes)
         
-        total_phase_moves = sum(phase_counts.values())
-        phase_distribution = {
-            phase: count / total_phase_moves if total_phase_moves > 0 else 0
-            for phase, count in phase_counts.items()
-        }
-        
-        # Calculate average complexity
-        avg_complexity = sum(m.get('position_complexity', 0.5) for m in level_moves) / len(level_moves)
+        # Calculate phase distribution, average complexity and rating in one pass
+        level_stats = calculate_level_stats(level_moves)
+        phase_distribution = level_stats['phase_distribution']
+        avg_complexity = level_stats['average_complexity']
         
         # Create output data structure with enhanced metadata
         output_data = {
@@ -440,9 +550,9 @@ def save_difficulty_levels(difficulty_levels, original_data, output_dir):
                 'name': level_name,
                 'level': i + 1,
                 'move_count': len(level_moves),
-                'average_rating': sum(m['rating'] for m in level_moves) / len(level_moves),
-                'min_difficulty': min(m['difficulty'] for m in level_moves),
-                'max_difficulty': max(m['difficulty'] for m in level_moves),
+                'average_rating': level_stats['average_rating'],
+                'min_difficulty': level_stats['min_difficulty'],
+                'max_difficulty': level_stats['max_difficulty'],
                 'approximate_elo_range': elo_ranges[i],
                 'phase_distribution': phase_distribution,
                 'average_complexity': avg_complexity,
@@ -452,8 +562,7 @@ def save_difficulty_levels(difficulty_levels, original_data, output_dir):
         
         # Save to file
         output_file = os.path.join(output_dir, f"chess_knowledge_level_{i+1}_{level_name}.json")
-        with open(output_file, 'w') as f:
-            json.dump(output_data, f, indent=2)
+        write_json_file(output_data, output_file)
         
         print(f"Saved {level_name} level with {len(level_moves)} moves to {output_file}")
         print(f"  - ELO range: {elo_ranges[i][0]}-{elo_ranges[i][1]}")
@@ -492,23 +601,22 @@ def get_level_description(level_name, elo_range):
 
 def analyze_opening_moves(moves_with_difficulty):
     """Analyze opening moves to identify common openings"""
-    opening_sequences = defaultdict(int)
-    
-    for move in moves_with_difficulty:
-        if move.get('depth', 0) < 10 and move.get('game_phase') == 'opening':
-            sequence = ' '.join(move.get('move_sequence', []))
-            opening_sequences[sequence] += 1
+    # Count sequences as tuples and only join the ones that are returned
+    opening_sequences = Counter(
+        move.move_sequence
+        for move in moves_with_difficulty
+        if move.depth < 10 and move.game_phase == 'opening'
+    )
     
     # Return the most common opening sequences
-    return sorted(opening_sequences.items(), key=lambda x: x[1], reverse=True)[:20]
+    return [(' '.join(sequence), count) for sequence, count in opening_sequences.most_common(20)]
 
 def save_to_local_storage(data, key):
     """Save data to browser's localStorage (simulation for Python)"""
     print(f"[Simulation] Saving data to localStorage with key: {key}")
     # In a real browser context, this would use localStorage.setItem(key, JSON.stringify(data))
     # For Python simulation, we'll just save to a file
-    with open(f"{key}.json", 'w') as f:
-        json.dump(data, f, indent=2)
+    write_json_file(data, f"{key}.json")
 
 def main():
     # Get input file from user
@@ -550,8 +658,7 @@ def main():
     }
     
     summary_file = os.path.join(output_dir, "difficulty_summary.json")
-    with open(summary_file, 'w') as f:
-        json.dump(summary, f, indent=2)
+    write_json_file(summary, summary_file)
     
     print(f"Successfully split chess knowledge into 8 difficulty levels in {output_dir}")
     print(f"Summary information saved to {summary_file}")